@@ -0,0 +1,107 @@
+import base64
+import copy
+import gzip
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi.testclient import TestClient
+
+import server
+
+# Karşılaştırma, server.app'in gerçek middleware zinciri (CORS, yükleme limiti, gzip)
+# üzerinden yapılır: eski yol (string tarihler + response_model doğrulaması,
+# görseller listede ve sıkıştırılarak) ile yeni yol (ham dokümanlar + orjson)
+NUM_EXAMS = int(os.environ.get("BENCH_EXAMS", "20"))
+NUM_QUESTIONS = int(os.environ.get("BENCH_QUESTIONS", "50"))
+IMAGE_EVERY = 5
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "20"))
+
+
+def make_exams(native_dates: bool) -> List[dict]:
+    image = base64.b64encode(os.urandom(30_000)).decode()
+    exams = []
+    for e in range(NUM_EXAMS):
+        created = datetime.now(timezone.utc)
+        exams.append({
+            "id": str(uuid.uuid4()), "user_id": "bench", "folder_id": None, "title": f"Exam {e}",
+            "exam_type": "mixed", "difficulty": "medium", "pdf_name": "notes.pdf",
+            "created_at": created if native_dates else created.isoformat(),
+            "questions": [{
+                "id": str(uuid.uuid4()), "question_text": f"Soru {i}: Aşağıdakilerden hangisi doğrudur?",
+                "question_type": "multiple_choice", "options": ["A", "B", "C", "D", "E"],
+                "correct_answer": "A", "explanation": "Açıklama metni " * 10,
+                "image_data": image if i % IMAGE_EVERY == 0 else None,
+            } for i in range(NUM_QUESTIONS)],
+        })
+    return exams
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeExams:
+    """Motor koleksiyonunun okuma endpointlerinin kullandığı kısmı; projeksiyonu uygular."""
+
+    def __init__(self, docs, apply_projection: bool):
+        self.docs = docs
+        self.apply_projection = apply_projection
+
+    def _project(self, doc, projection):
+        if not self.apply_projection or "questions.image_data" not in projection: return doc
+        doc = copy.copy(doc)
+        doc["questions"] = [{k: v for k, v in q.items() if k != "image_data"} for q in doc["questions"]]
+        return doc
+
+    def find(self, query, projection):
+        return FakeCursor([self._project(d, projection) for d in self.docs])
+
+    async def find_one(self, query, projection):
+        return next(d for d in self.docs if d["id"] == query["id"])
+
+
+class FakeDB:
+    def __init__(self, docs, apply_projection: bool):
+        self.exams = FakeExams(docs, apply_projection)
+
+
+def bench(client: TestClient, path: str):
+    client.get(path)
+    t = time.perf_counter()
+    for _ in range(ROUNDS):
+        response = client.get(path)
+    return (time.perf_counter() - t) / ROUNDS * 1000, response.num_bytes_downloaded
+
+
+def run(docs: List[dict], fast: bool):
+    server.FAST_SERIALIZATION = fast
+    server.db = FakeDB(docs, apply_projection=fast)
+    # Lifespan çalıştırılmaz; veritabanı yerine FakeDB kullanılır
+    client = TestClient(server.app, headers={"Accept-Encoding": "gzip"})
+    return bench(client, "/api/exams"), bench(client, f"/api/exams/{docs[0]['id']}")
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    server.app.dependency_overrides[server.get_current_user] = lambda: {"id": "bench"}
+    legacy_docs, native_docs = make_exams(native_dates=False), make_exams(native_dates=True)
+    (legacy_list_ms, legacy_list_size), (legacy_one_ms, legacy_one_size) = run(legacy_docs, fast=False)
+    (fast_list_ms, fast_list_size), (fast_one_ms, fast_one_size) = run(native_docs, fast=True)
+
+    print(f"📊 {NUM_EXAMS} sınav x {NUM_QUESTIONS} soru, her {IMAGE_EVERY}. soruda görsel, gzip seviye {server.GZIP_LEVEL}")
+    print(f"🐢 Eski yol  /exams: {legacy_list_ms:7.1f} ms, {legacy_list_size / 1024:6.0f} KB | /exams/{{id}}: {legacy_one_ms:6.1f} ms, {legacy_one_size / 1024:5.0f} KB")
+    print(f"🚀 Yeni yol  /exams: {fast_list_ms:7.1f} ms, {fast_list_size / 1024:6.0f} KB | /exams/{{id}}: {fast_one_ms:6.1f} ms, {fast_one_size / 1024:5.0f} KB")
+
+    # Görsel içeren gövdeyi seviye 9 ile sıkıştırmanın maliyeti (eski varsayılan)
+    body = server.FastJSONResponse(legacy_docs).body
+    t = time.perf_counter()
+    packed = gzip.compress(body, 9)
+    print(f"🗜️  {len(body) / 1024 / 1024:.1f} MB görselli JSON, gzip -9: {(time.perf_counter() - t) * 1000:.0f} ms, %{len(packed) / len(body) * 100:.0f} boyut")
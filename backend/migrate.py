@@ -0,0 +1,27 @@
+import asyncio
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# server.py import edilirken .env yüklenir
+from server import migrate_datetimes, migrate_exam_results
+
+
+async def main():
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        before = await db.command("collStats", "exam_results")
+        print(f"📦 exam_results boyutu: {before['size'] / 1024:.1f} KB ({before['count']} doküman)")
+        migrated = await migrate_exam_results(db)
+        after = await db.command("collStats", "exam_results")
+        print(f"✅ {migrated} sonuç kompakt formata taşındı.")
+        print(f"📦 Yeni boyut: {after['size'] / 1024:.1f} KB")
+
+        converted = await migrate_datetimes(db)
+        print(f"✅ {converted} dokümandaki tarih alanı gerçek tarih tipine çevrildi.")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,37 +2,48 @@ from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Literal
+from typing import BinaryIO, List, Optional, Literal, NamedTuple, Union, TYPE_CHECKING
 import uuid
 from datetime import datetime, timezone, timedelta
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from collections import OrderedDict, deque
+import asyncio
+import math
+import time
 import jwt
 from passlib.context import CryptContext
-import tempfile
-from PyPDF2 import PdfReader
-import google.generativeai as genai
-from pdf2image import convert_from_path
-from PIL import Image
+import hashlib
 import base64
 import io
 import random
 import json
+import re
+import shutil
+import tempfile
 import warnings
 
+# Ağır bağımlılıklar (google.generativeai, PyPDF2, pdf2image, PIL, fitz) ilk kullanımda yüklenir
+if TYPE_CHECKING:
+    from PIL import Image
+
 # Gereksiz uyarıları gizle
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (lifespan içinde açılır)
+client: Optional[AsyncIOMotorClient] = None
+db = None
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -42,11 +53,75 @@ security = HTTPBearer()
 
 # Google AI Key
 GOOGLE_AI_KEY = os.environ.get("GOOGLE_AI_KEY")
+MODEL_NAMES = ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-2.5-pro']
+
+@lru_cache(maxsize=None)
+def get_genai():
+    import google.generativeai as genai
+    genai.configure(api_key=GOOGLE_AI_KEY)
+    return genai
+
+@lru_cache(maxsize=None)
+def get_model(model_name: str):
+    return get_genai().GenerativeModel(model_name)
+
+def prewarm():
+    """Ağır modülleri ve model istemcilerini ilk istekten önce yükler."""
+    from PyPDF2 import PdfReader  # noqa: F401
+    from pdf2image import convert_from_path  # noqa: F401
+    from PIL import Image  # noqa: F401
+    try:
+        import fitz  # noqa: F401
+    except ImportError:
+        pass
+    for model_name in MODEL_NAMES:
+        get_model(model_name)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    if os.environ.get("PREWARM", "").lower() in ("1", "true", "yes"):
+        await asyncio.to_thread(prewarm)
+    try:
+        yield
+    finally:
+        client.close()
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
+# Okuma endpointleri DB dokümanlarını Pydantic'ten geçirmeden doğrudan JSON'a yazar
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "4"))
+FAST_SERIALIZATION = os.environ.get("FAST_SERIALIZATION", "1").lower() in ("1", "true", "yes")
+
+def _json_default(obj):
+    if isinstance(obj, datetime): return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+# Base64 görseller gzip ile neredeyse küçülmez; bunları taşıyan yanıtlar sıkıştırılmaz
+UNCOMPRESSED = {"Content-Encoding": "identity"}
+
+def db_response(data, compress: bool = True):
+    if not FAST_SERIALIZATION: return data
+    return FastJSONResponse(data, headers=None if compress else UNCOMPRESSED)
+
+def has_images(exam: dict) -> bool:
+    return any(q.get("image_data") for q in exam.get("questions", []))
+
 # --- MODELS ---
 
 class UserCreate(BaseModel):
@@ -100,6 +175,7 @@ class Exam(BaseModel):
     difficulty: str
     questions: List[Question]
     pdf_name: Optional[str] = None
+    pdf_hash: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ExamAnswer(BaseModel):
@@ -118,8 +194,9 @@ class ExamResult(BaseModel):
     score: float
     total_questions: int
     correct_answers: int
-    answers: List[ExamAnswer]
-    feedback: List[dict]
+    answers: Optional[List[ExamAnswer]] = None
+    verdicts: Optional[str] = None  # hex bitset, answers sırasıyla
+    feedback: Optional[List[dict]] = None  # okuma anında sınavdan birleştirilir
     submitted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Summary(BaseModel):
@@ -177,14 +254,60 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    reader = PdfReader(pdf_path)
+# Starlette multipart gövdesini endpoint çalışmadan önce kendi SpooledTemporaryFile'ına
+# yazar (1 MB'a kadar bellekte, üstü diskte). Magic byte, boyut ve hash tek geçişte
+# kontrol edilir; metin çıkarma doğrudan bu dosyadan yapılır, kopya oluşturulmaz.
+# Gövde okunmadan yapılan tek erken kontrol Content-Length middleware'idir.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+UPLOAD_MEMORY_BYTES = int(os.environ.get("UPLOAD_MEMORY_MB", "8")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+PDF_MAGIC = b"%PDF-"
+
+PdfSource = Union[bytes, str]  # görüntü işleme için bellekteki içerik veya geçici dosya yolu
+
+class PdfUpload(NamedTuple):
+    file: BinaryIO  # Starlette'in spool dosyası
+    sha256: str
+    size: int
+
+async def read_pdf_upload(upload: UploadFile) -> PdfUpload:
+    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+    if PDF_MAGIC not in chunk[:1024]: raise HTTPException(400, "PDF only")
+    digest, size = hashlib.sha256(), 0
+    while chunk:
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES: raise HTTPException(413, "File too large")
+        digest.update(chunk)
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+    await upload.seek(0)
+    return PdfUpload(file=upload.file, sha256=digest.hexdigest(), size=size)
+
+@contextmanager
+def pdf_for_rendering(upload: PdfUpload):
+    """fitz ve pdf2image bayt veya dosya yolu ister. Küçük dosyalar belleğe okunur,
+    büyükler bir kez isimli geçici dosyaya kopyalanır ve işten sonra silinir."""
+    upload.file.seek(0)
+    if upload.size <= UPLOAD_MEMORY_BYTES:
+        yield upload.file.read()
+        return
+    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    try:
+        with tmp: shutil.copyfileobj(upload.file, tmp, UPLOAD_CHUNK_SIZE)
+        yield tmp.name
+    finally:
+        os.unlink(tmp.name)
+
+def extract_text_from_pdf(pdf_file: BinaryIO) -> str:
+    from PyPDF2 import PdfReader
+    pdf_file.seek(0)
+    reader = PdfReader(pdf_file)
     text = ""
     for page in reader.pages:
         text += page.extract_text()
     return text
 
-def _pil_image_to_base64(img: Image.Image) -> str:
+def _pil_image_to_base64(img: "Image.Image") -> str:
+    from PIL import Image
     max_size = 1024
     img = img.convert("RGB")
     if img.width > max_size or img.height > max_size:
@@ -193,9 +316,11 @@ def _pil_image_to_base64(img: Image.Image) -> str:
     img.save(buffer, format="JPEG", quality=85)
     return base64.b64encode(buffer.getvalue()).decode()
 
-def _extract_images_with_pdf2image(pdf_path: str, target_count: int) -> List[dict]:
+def _extract_images_with_pdf2image(pdf_source: PdfSource, target_count: int) -> List[dict]:
     try:
-        pages = convert_from_path(pdf_path, dpi=200, fmt="jpeg")
+        from pdf2image import convert_from_bytes, convert_from_path
+        convert = convert_from_bytes if isinstance(pdf_source, bytes) else convert_from_path
+        pages = convert(pdf_source, dpi=200, fmt="jpeg")
         if not pages: return []
         if len(pages) < target_count: return []
         selected_indices = random.sample(range(len(pages)), target_count)
@@ -207,11 +332,12 @@ def _extract_images_with_pdf2image(pdf_path: str, target_count: int) -> List[dic
         logging.error(f"Error extracting images: {str(e)}")
         return []
 
-def extract_images_from_pdf(pdf_path: str, target_count: int) -> List[dict]:
+def extract_images_from_pdf(pdf_source: PdfSource, target_count: int) -> List[dict]:
     if target_count <= 0: raise HTTPException(status_code=400, detail="Positive count required")
     try:
         import fitz
-        doc = fitz.open(pdf_path)
+        from PIL import Image
+        doc = fitz.open(stream=pdf_source, filetype="pdf") if isinstance(pdf_source, bytes) else fitz.open(pdf_source)
         try:
             total_pages = len(doc)
             if total_pages < target_count: raise HTTPException(status_code=400, detail="Not enough pages")
@@ -227,7 +353,7 @@ def extract_images_from_pdf(pdf_path: str, target_count: int) -> List[dict]:
         finally:
             doc.close()
     except Exception:
-        images = _extract_images_with_pdf2image(pdf_path, target_count)
+        images = _extract_images_with_pdf2image(pdf_source, target_count)
         if not images: raise HTTPException(status_code=500, detail="Image extraction failed")
         return images
 
@@ -237,22 +363,20 @@ def get_random_pdf_sections(pdf_text: str, num_sections: int = 3) -> str:
     selected_paragraphs = random.sample(paragraphs, min(num_sections, len(paragraphs)))
     return '\n\n'.join(selected_paragraphs)
 
-async def generate_image_based_exam(pdf_path: str, difficulty: str, num_questions: int) -> List[Question]:
+async def generate_image_based_exam(pdf_source: PdfSource, difficulty: str, num_questions: int) -> List[Question]:
     try:
-        images = extract_images_from_pdf(pdf_path, num_questions)
-        genai.configure(api_key=GOOGLE_AI_KEY)
+        images = extract_images_from_pdf(pdf_source, num_questions)
         difficulty_tr = {"easy": "kolay", "medium": "orta", "hard": "zor"}.get(difficulty, difficulty)
         questions = []
-        model_names = ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-2.5-pro']
         
         for idx, page_image in enumerate(images):
             prompt = f"""Sen uzman bir sınavcısın. Görseli analiz et ve {difficulty_tr} seviyesinde 1 görsel tabanlı çoktan seçmeli soru üret.
             JSON formatında: {{"question_text": "...", "question_type": "image_based", "options": ["A...", "B...", "C...", "D...", "E..."], "correct_answer": "A", "explanation": "..."}}"""
             
             response_text = None
-            for model_name in model_names:
+            for model_name in MODEL_NAMES:
                 try:
-                    model = genai.GenerativeModel(model_name)
+                    model = get_model(model_name)
                     res = model.generate_content([prompt, {"mime_type": "image/jpeg", "data": page_image["image_data"]}])
                     response_text = res.text.strip()
                     break
@@ -269,38 +393,73 @@ async def generate_image_based_exam(pdf_path: str, difficulty: str, num_question
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image exam error: {str(e)}")
 
-async def generate_exam_with_ai(pdf_text: str, exam_type: str, difficulty: str, num_questions: int) -> List[Question]:
-    try:
-        genai.configure(api_key=GOOGLE_AI_KEY)
-        
-        type_instruction = {
-            "multiple_choice": {
-                "instruction": "Çoktan seçmeli sorular oluştur. 'options' listesinde 5 seçenek (A,B,C,D,E) olsun. Doğru cevabı sadece harf olarak (örn: 'A') belirt.",
-                "question_type": "multiple_choice"
-            },
-            "true_false": {
-                "instruction": "Doğru/Yanlış soruları oluştur. Soru bir yargı cümlesi olsun. 'options' listesi HER ZAMAN ['Doğru', 'Yanlış'] olsun. Doğru cevap 'Doğru' veya 'Yanlış' olsun.",
-                "question_type": "true_false"
-            },
-            "fill_blank": {
-                "instruction": "Boşluk doldurma soruları oluştur. Soru metninde boş bırakılan yeri '__________' ile göster. 'options' listesini BOŞ bırak ([]). 'correct_answer' kısmına sadece boşluğa gelecek kelimeyi/kelimeleri yaz.",
-                "question_type": "fill_blank"
-            },
-            "open_ended": {
-                "instruction": "Klasik (açık uçlu) sorular oluştur. Düşünmeye ve açıklamaya dayalı sorular olsun. 'options' listesini BOŞ bırak ([]). 'correct_answer' kısmına örnek ideal cevabı yaz.",
-                "question_type": "open_ended"
-            },
-            "mixed": {
-                "instruction": "Karışık türde sorular oluştur: Listede rastgele olarak 'multiple_choice', 'true_false', 'fill_blank' ve 'open_ended' türleri olsun. Her sorunun türüne göre yukarıdaki kurallara uy.",
-                "question_type": "mixed"
-            }
-        }
-        
-        diff_tr = {"easy": "kolay", "medium": "orta", "hard": "zor"}.get(difficulty, difficulty)
-        exam_instruction = type_instruction[exam_type]
-        content = get_random_pdf_sections(pdf_text, 5)
-        
-        prompt = f"""Sen uzman bir sınavcısın. Aşağıdaki içerikten {num_questions} adet {diff_tr} seviyesinde soru üret.
+EXAM_TYPE_INSTRUCTIONS = {
+    "multiple_choice": {
+        "instruction": "Çoktan seçmeli sorular oluştur. 'options' listesinde 5 seçenek (A,B,C,D,E) olsun. Doğru cevabı sadece harf olarak (örn: 'A') belirt.",
+        "question_type": "multiple_choice"
+    },
+    "true_false": {
+        "instruction": "Doğru/Yanlış soruları oluştur. Soru bir yargı cümlesi olsun. 'options' listesi HER ZAMAN ['Doğru', 'Yanlış'] olsun. Doğru cevap 'Doğru' veya 'Yanlış' olsun.",
+        "question_type": "true_false"
+    },
+    "fill_blank": {
+        "instruction": "Boşluk doldurma soruları oluştur. Soru metninde boş bırakılan yeri '__________' ile göster. 'options' listesini BOŞ bırak ([]). 'correct_answer' kısmına sadece boşluğa gelecek kelimeyi/kelimeleri yaz.",
+        "question_type": "fill_blank"
+    },
+    "open_ended": {
+        "instruction": "Klasik (açık uçlu) sorular oluştur. Düşünmeye ve açıklamaya dayalı sorular olsun. 'options' listesini BOŞ bırak ([]). 'correct_answer' kısmına örnek ideal cevabı yaz.",
+        "question_type": "open_ended"
+    },
+    "mixed": {
+        "instruction": "Karışık türde sorular oluştur: Listede rastgele olarak 'multiple_choice', 'true_false', 'fill_blank' ve 'open_ended' türleri olsun. Her sorunun türüne göre yukarıdaki kurallara uy.",
+        "question_type": "mixed"
+    }
+}
+
+# Büyük sınavlar bu boyutta paralel parçalara bölünür
+EXAM_BATCH_SIZE = 10
+EXAM_TOPUP_ROUNDS = 2
+EXAM_MIN_SLICE_CHARS = 1000
+EXAM_MAX_PARALLEL_BATCHES = int(os.environ.get("EXAM_MAX_PARALLEL_BATCHES", "5"))
+DUPLICATE_THRESHOLD = 0.6
+
+def split_pdf_sections(pdf_text: str, num_slices: int) -> List[str]:
+    """Metni en fazla num_slices ardışık dilime böler; kısa metinlerde daha az dilim döner."""
+    paragraphs = [p.strip() for p in pdf_text.split('\n\n') if p.strip()]
+    if len(paragraphs) < num_slices * 2:
+        # Paragraf ayrımı yoksa metni kelime sınırlarına oturan karakter pencerelerine böl
+        num_slices = max(1, min(num_slices, len(pdf_text) // EXAM_MIN_SLICE_CHARS))
+        bounds = [0]
+        for i in range(1, num_slices):
+            edge = re.compile(r"\s").search(pdf_text, max(bounds[-1], i * len(pdf_text) // num_slices))
+            bounds.append(edge.start() if edge else len(pdf_text))
+        bounds.append(len(pdf_text))
+        slices = [pdf_text[start:end].strip() for start, end in zip(bounds, bounds[1:])]
+        return [sl for sl in slices if sl] or [pdf_text]
+    size = len(paragraphs) / num_slices
+    return ['\n\n'.join(paragraphs[round(i * size):round((i + 1) * size)]) for i in range(num_slices)]
+
+def _question_shingles(text: str, k: int = 3) -> set:
+    words = re.findall(r"\w+", text.casefold())
+    if len(words) < k: return {tuple(words)}
+    return {tuple(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+def dedupe_questions(existing: List[Question], candidates: List[Question], threshold: float = DUPLICATE_THRESHOLD) -> List[Question]:
+    """Mevcut sorulara (veya birbirine) çok benzeyen adayları eler (kelime shingle Jaccard)."""
+    def key(q: Question) -> set:
+        return _question_shingles(" ".join([q.question_text, *(q.options or [])]))
+    seen = [key(q) for q in existing]
+    accepted = []
+    for q in candidates:
+        sh = key(q)
+        if any(len(sh & s) / len(sh | s) >= threshold for s in seen if sh | s): continue
+        seen.append(sh)
+        accepted.append(q)
+    return accepted
+
+async def _generate_question_batch(content: str, exam_type: str, diff_tr: str, num_questions: int) -> List[Question]:
+    exam_instruction = EXAM_TYPE_INSTRUCTIONS[exam_type]
+    prompt = f"""Sen uzman bir sınavcısın. Aşağıdaki içerikten {num_questions} adet {diff_tr} seviyesinde soru üret.
         
         Soru Türü Talimatı: {exam_instruction["instruction"]}
         
@@ -319,38 +478,71 @@ async def generate_exam_with_ai(pdf_text: str, exam_type: str, difficulty: str,
         
         JSON dışında hiçbir metin yazma.
         """
+    
+    response_text = None
+    for model_name in MODEL_NAMES:
+        try:
+            model = get_model(model_name)
+            res = await model.generate_content_async(prompt)
+            response_text = res.text.strip()
+            break
+        except: continue
         
-        response_text = None
-        for model_name in ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-2.5-pro']:
-            try:
-                model = genai.GenerativeModel(model_name)
-                res = model.generate_content(prompt)
-                response_text = res.text.strip()
-                break
-            except: continue
-            
-        if not response_text: raise HTTPException(status_code=500, detail="AI generation failed")
-        if response_text.startswith("```"): response_text = response_text.split("\n", 1)[1].rsplit("```", 1)[0]
-        try: q_data = json.loads(response_text)
-        except: q_data = json.loads(response_text.replace("```json", "").replace("```", "").strip())
+    if not response_text: raise HTTPException(status_code=500, detail="AI generation failed")
+    if response_text.startswith("```"): response_text = response_text.split("\n", 1)[1].rsplit("```", 1)[0]
+    try: q_data = json.loads(response_text)
+    except: q_data = json.loads(response_text.replace("```json", "").replace("```", "").strip())
+    
+    questions = []
+    for q in q_data:
+        if "question_type" in q:
+            q["question_type"] = q["question_type"].replace("-", "_")
+        if q.get("question_type") == "true_false":
+            q["options"] = ["Doğru", "Yanlış"]
+        if q.get("question_type") in ["fill_blank", "open_ended"]:
+            q["options"] = []
+        # Bozuk tek bir soru tüm parçayı düşürmesin
+        try: questions.append(Question(**q))
+        except Exception: continue
+    return questions
+
+async def generate_exam_with_ai(pdf_text: str, exam_type: str, difficulty: str, num_questions: int) -> List[Question]:
+    try:
+        diff_tr = {"easy": "kolay", "medium": "orta", "hard": "zor"}.get(difficulty, difficulty)
+        questions: List[Question] = []
+        errors = []
+        # Aynı anda en fazla EXAM_MAX_PARALLEL_BATCHES model çağrısı
+        semaphore = asyncio.Semaphore(EXAM_MAX_PARALLEL_BATCHES)
+        async def limited(batch):
+            async with semaphore: return await batch
+        for _ in range(1 + EXAM_TOPUP_ROUNDS):
+            missing = num_questions - len(questions)
+            if missing <= 0: break
+            # Her parça farklı bir içerik diliminden, tekrarlara karşı biraz fazla soru ister
+            num_batches = math.ceil(missing / EXAM_BATCH_SIZE)
+            counts = [missing // num_batches + (i < missing % num_batches) for i in range(num_batches)]
+            slices = split_pdf_sections(pdf_text, num_batches)
+            batches = await asyncio.gather(
+                *(limited(_generate_question_batch(get_random_pdf_sections(slices[i % len(slices)], 5), exam_type, diff_tr, count + math.ceil(count * 0.2))) for i, count in enumerate(counts)),
+                return_exceptions=True,
+            )
+            for batch in batches:
+                if isinstance(batch, Exception):
+                    errors.append(batch)
+                    continue
+                questions += dedupe_questions(questions, batch)
         
-        for q in q_data:
-            if "question_type" in q:
-                q["question_type"] = q["question_type"].replace("-", "_")
-            if q["question_type"] == "true_false":
-                q["options"] = ["Doğru", "Yanlış"]
-            if q["question_type"] in ["fill_blank", "open_ended"]:
-                q["options"] = []
-
-        return [Question(**q) for q in q_data]
+        if not questions: raise errors[0] if errors else HTTPException(status_code=500, detail="AI generation failed")
+        if len(questions) < num_questions:
+            logging.warning(f"Exam generation returned {len(questions)}/{num_questions} questions")
+        return questions[:num_questions]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Text exam error: {str(e)}")
 
 # --- YENİ EKLENDİ: FLASHCARD GENERATION FUNCTION ---
 async def generate_flashcards_with_ai(pdf_text: str) -> List[Flashcard]:
     try:
-        genai.configure(api_key=GOOGLE_AI_KEY)
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = get_model('gemini-2.5-flash')
         
         # İçeriği biraz kırpalım ki token limitine takılmasın
         content = pdf_text[:10000]
@@ -389,14 +581,18 @@ async def generate_flashcards_with_ai(pdf_text: str) -> List[Flashcard]:
         raise HTTPException(status_code=500, detail="Flashcard generation failed")
 
 
+def answer_matches(c_ans, u_ans, q_type) -> bool:
+    """AI çağrısı gerektirmeyen kesin eşleşmeler (aynı metin veya şık harfi)."""
+    if u_ans.strip().lower() == c_ans.strip().lower(): return True
+    if q_type == "multiple_choice":
+        u, c = u_ans.strip().upper(), c_ans.strip().upper()
+        if (len(c) == 1 and u.startswith(c + ".")) or (len(u) == 1 and c.startswith(u + ".")): return True
+    return False
+
 async def evaluate_answer_with_ai(q_text, c_ans, u_ans, q_type) -> bool:
     try:
-        if u_ans.strip().lower() == c_ans.strip().lower(): return True
-        if q_type == "multiple_choice":
-            u, c = u_ans.strip().upper(), c_ans.strip().upper()
-            if (len(c) == 1 and u.startswith(c + ".")) or (len(u) == 1 and c.startswith(u + ".")): return True
-            
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        if answer_matches(c_ans, u_ans, q_type): return True
+        model = get_model('gemini-2.5-flash')
         prompt = f"""
         Soru: {q_text}
         Doğru Cevap: {c_ans}
@@ -409,13 +605,233 @@ async def evaluate_answer_with_ai(q_text, c_ans, u_ans, q_type) -> bool:
         return json.loads(text).get("is_correct", False)
     except: return u_ans.strip().lower() == c_ans.strip().lower()
 
+# --- SONUÇ DEPOLAMA (KOMPAKT) ---
+# Sonuçlarda sadece cevaplar ve doğru/yanlış bitset'i saklanır.
+# Doğru cevap ve açıklama okuma anında sınavdan birleştirilir.
+
+def pack_verdicts(flags: List[bool]) -> str:
+    bits = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag: bits[i >> 3] |= 1 << (i & 7)
+    return bits.hex()
+
+def unpack_verdicts(packed: str, count: int) -> List[bool]:
+    bits = bytes.fromhex(packed or "")
+    return [i >> 3 < len(bits) and bool(bits[i >> 3] >> (i & 7) & 1) for i in range(count)]
+
+def compact_result(doc: dict) -> dict:
+    """Eski formattaki (feedback listeli) sonucu kompakt formata çevirir."""
+    if "feedback" in doc:
+        verdict_by_qid = {f["question_id"]: f.get("is_correct", False) for f in doc.pop("feedback") or []}
+        doc["verdicts"] = pack_verdicts([verdict_by_qid.get(a["question_id"], False) for a in doc.get("answers", [])])
+    return doc
+
+def build_feedback(result: dict, exam: Optional[dict]) -> List[dict]:
+    questions = {q["id"]: q for q in exam["questions"]} if exam else {}
+    answers = result.get("answers", [])
+    fb = []
+    for ans, is_c in zip(answers, unpack_verdicts(result.get("verdicts", ""), len(answers))):
+        q = questions.get(ans["question_id"])
+        if q: fb.append({"question_id": ans["question_id"], "is_correct": is_c, "correct_answer": q["correct_answer"], "user_answer": ans["user_answer"], "explanation": q.get("explanation", "")})
+    return fb
+
+async def migrate_exam_results(database, batch_size: int = 500) -> int:
+    """exam_results koleksiyonundaki eski dokümanları kompakt formata taşır."""
+    migrated, ops = 0, []
+    async for doc in database.exam_results.find({"feedback": {"$exists": True}}, {"_id": 1, "answers": 1, "feedback": 1}):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"verdicts": compact_result(doc)["verdicts"]}, "$unset": {"feedback": ""}}))
+        if len(ops) >= batch_size:
+            migrated += (await database.exam_results.bulk_write(ops, ordered=False)).modified_count; ops = []
+    if ops: migrated += (await database.exam_results.bulk_write(ops, ordered=False)).modified_count
+    return migrated
+
+# Eski dokümanlardaki isoformat string tarihleri gerçek tarih tipine çevrilir
+DATETIME_FIELDS = {"users": "created_at", "folders": "created_at", "exams": "created_at", "summaries": "created_at", "flashcards": "created_at", "exam_results": "submitted_at"}
+
+async def migrate_datetimes(database, batch_size: int = 500) -> int:
+    migrated = 0
+    for collection, field in DATETIME_FIELDS.items():
+        ops = []
+        async for doc in database[collection].find({field: {"$type": "string"}}, {"_id": 1, field: 1}):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: datetime.fromisoformat(doc[field])}}))
+            if len(ops) >= batch_size:
+                migrated += (await database[collection].bulk_write(ops, ordered=False)).modified_count; ops = []
+        if ops: migrated += (await database[collection].bulk_write(ops, ordered=False)).modified_count
+    return migrated
+
+# --- İSTEK KABUL KONTROLÜ (AI ENDPOINTLERİ) ---
+
+# İşlem -> (öncelik, token maliyeti). Düşük öncelik değeri önce çalışır.
+AI_OPERATIONS = {
+    "grade": (0, 1),  # AI ile değerlendirilen her cevap için
+    "summarize": (1, 2),
+    "flashcards": (1, 2),
+    "exam": (1, 2),  # her EXAM_BATCH_SIZE soruluk parça için
+}
+
+class AdmissionController:
+    """Kullanıcı başına ve global eşzamanlılık + token bucket limitleri.
+
+    Global slotlar doluysa istekler önceliğe göre, aynı öncelikte ise
+    kullanıcılar arasında sırayla (round-robin) kuyruktan çıkar.
+    Limit aşıldığında Retry-After başlığıyla hemen 429 döner.
+    """
+
+    def __init__(self, global_limit: int, user_limit: int, rate: float, burst: float, global_rate: float, global_burst: float, max_queue: int, queue_timeout: float):
+        self.global_limit = global_limit
+        self.user_limit = user_limit
+        self.rate = rate
+        self.burst = burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.avg_hold = 5.0
+        self._active = {}
+        self._buckets = {}  # dolu kovalar saklanmaz
+        self._global_bucket = (global_burst, time.monotonic())
+        self._queues = {p: OrderedDict() for p in sorted({p for p, _ in AI_OPERATIONS.values()})}
+        self._waiting = 0
+
+    def _reject(self, detail: str, retry_after: float):
+        raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    def _tokens(self, user_id: str) -> float:
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < self.burst: self._buckets[user_id] = (tokens, now)
+        return tokens
+
+    def _global_tokens(self) -> float:
+        now = time.monotonic()
+        tokens, last = self._global_bucket
+        tokens = min(self.global_burst, tokens + (now - last) * self.global_rate)
+        self._global_bucket = (tokens, now)
+        return tokens
+
+    def _charge(self, user_id: str, cost: float):
+        # Negatif maliyet iadedir
+        now = time.monotonic()
+        tokens = min(self.burst, self._tokens(user_id) - cost)
+        self._buckets.pop(user_id, None)
+        if tokens < self.burst: self._buckets[user_id] = (tokens, now)
+        self._global_bucket = (min(self.global_burst, self._global_tokens() - cost), now)
+
+    def _user_waiting(self, user_id: str) -> int:
+        return sum(len(q.get(user_id, ())) for q in self._queues.values())
+
+    def _grant(self, user_id: str):
+        self.in_flight += 1
+        self._active[user_id] = self._active.get(user_id, 0) + 1
+
+    def _dispatch(self):
+        for queue in self._queues.values():
+            while queue and self.in_flight < self.global_limit:
+                user_id, waiters = next(iter(queue.items()))
+                fut, _ = waiters.popleft()
+                self._waiting -= 1
+                if waiters: queue.move_to_end(user_id)
+                else: del queue[user_id]
+                self._grant(user_id)
+                fut.set_result(None)
+
+    def _release(self, user_id: str, held: float):
+        self.in_flight -= 1
+        self._active[user_id] -= 1
+        if not self._active[user_id]: del self._active[user_id]
+        self.avg_hold = 0.8 * self.avg_hold + 0.2 * held
+        self._dispatch()
+
+    async def acquire(self, user_id: str, operation: str, units: int = 1):
+        priority, cost = AI_OPERATIONS[operation]
+        # Çok parçalı işler daha pahalıdır; kova kapasitesini aşmaması için sınırlanır
+        cost = min(cost * units, self.burst, self.global_burst)
+        if self._active.get(user_id, 0) + self._user_waiting(user_id) >= self.user_limit:
+            self._reject("Too many concurrent AI requests", self.avg_hold)
+        queue_free = self.in_flight < self.global_limit and not self._waiting
+        if not queue_free and self._waiting >= self.max_queue:
+            self._reject("AI service busy", self.avg_hold * (self._waiting + 1) / self.global_limit)
+        tokens = self._tokens(user_id)
+        if tokens < cost:
+            self._reject("AI request budget exceeded", (cost - tokens) / self.rate)
+        global_tokens = self._global_tokens()
+        if global_tokens < cost:
+            self._reject("AI service busy", (cost - global_tokens) / self.global_rate)
+        self._charge(user_id, cost)
+
+        if queue_free:
+            self._grant(user_id)
+            return
+        entry = (asyncio.get_running_loop().create_future(), operation)
+        self._queues[priority].setdefault(user_id, deque()).append(entry)
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(entry[0]), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if entry[0].done():
+                # Slot tam zaman aşımı anında verildiyse geri bırak
+                self._release(user_id, 0.0)
+            else:
+                waiters = self._queues[priority][user_id]
+                waiters.remove(entry)
+                self._waiting -= 1
+                if not waiters: del self._queues[priority][user_id]
+            # İstek hiç çalışmadı; tokenları iade et
+            self._charge(user_id, -cost)
+            if isinstance(e, asyncio.CancelledError): raise
+            self._reject("AI queue timeout", self.avg_hold)
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, operation: str, units: int = 1):
+        await self.acquire(user_id, operation, units)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(user_id, time.monotonic() - started)
+
+    def state(self, user_id: Optional[str] = None) -> dict:
+        state = {
+            "in_flight": self.in_flight,
+            "global_limit": self.global_limit,
+            "global_tokens": round(self._global_tokens(), 2),
+            "global_burst": self.global_burst,
+            "queued": {op: sum(1 for q in self._queues.values() for w in q.values() for _, o in w if o == op) for op in AI_OPERATIONS},
+            "queued_users": len({u for q in self._queues.values() for u in q}),
+            "avg_hold_seconds": round(self.avg_hold, 2),
+        }
+        if user_id is not None:
+            state["user"] = {
+                "in_flight": self._active.get(user_id, 0),
+                "queued": self._user_waiting(user_id),
+                "limit": self.user_limit,
+                "tokens": round(self._tokens(user_id), 2),
+                "burst": self.burst,
+            }
+        return state
+
+# Limitler süreç başınadır: birden fazla uvicorn worker'ı ile çalışırken
+# gerçek limitler worker sayısıyla çarpılır.
+admission = AdmissionController(
+    global_limit=int(os.environ.get("AI_GLOBAL_CONCURRENCY", "8")),
+    user_limit=int(os.environ.get("AI_USER_CONCURRENCY", "2")),
+    rate=float(os.environ.get("AI_USER_TOKENS_PER_MIN", "12")) / 60,
+    burst=float(os.environ.get("AI_USER_BURST", "10")),
+    global_rate=float(os.environ.get("AI_GLOBAL_TOKENS_PER_MIN", "120")) / 60,
+    global_burst=float(os.environ.get("AI_GLOBAL_BURST", "60")),
+    max_queue=int(os.environ.get("AI_MAX_QUEUE", "64")),
+    queue_timeout=float(os.environ.get("AI_QUEUE_TIMEOUT", "30")),
+)
+
 # --- ROUTES ---
 
 @api_router.post("/auth/register", response_model=dict)
 async def register(ud: UserCreate):
     if await db.users.find_one({"email": ud.email}): raise HTTPException(400, "Email registered")
     user = User(email=ud.email, full_name=ud.full_name)
-    doc = user.model_dump(); doc["password_hash"] = hash_password(ud.password); doc["created_at"] = doc["created_at"].isoformat()
+    doc = user.model_dump(); doc["password_hash"] = hash_password(ud.password)
     await db.users.insert_one(doc)
     return {"token": create_access_token({"sub": user.id}), "user": user.model_dump()}
 
@@ -430,6 +846,7 @@ async def update_profile(full_name: str = Form(...), avatar: UploadFile = File(N
     upd = {"full_name": full_name}
     if avatar:
         try:
+            from PIL import Image
             img = Image.open(io.BytesIO(await avatar.read())).convert("RGB")
             img.thumbnail((300, 300))
             buf = io.BytesIO(); img.save(buf, format="JPEG", quality=70)
@@ -438,20 +855,21 @@ async def update_profile(full_name: str = Form(...), avatar: UploadFile = File(N
     await db.users.update_one({"id": cu["id"]}, {"$set": upd})
     return await db.users.find_one({"id": cu["id"]}, {"_id": 0})
 
+@api_router.get("/admission", response_model=dict)
+async def get_admission_state(cu: dict = Depends(get_current_user)):
+    return admission.state(cu["id"])
+
 # --- KLASÖR YÖNETİMİ ---
 
 @api_router.get("/folders", response_model=List[Folder])
 async def get_folders(cu: dict = Depends(get_current_user)):
     folders = await db.folders.find({"user_id": cu["id"]}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for f in folders:
-        if isinstance(f["created_at"], str): f["created_at"] = datetime.fromisoformat(f["created_at"])
-    return folders
+    return db_response(folders)
 
 @api_router.post("/folders", response_model=Folder)
 async def create_folder(folder_data: FolderCreate, cu: dict = Depends(get_current_user)):
     folder = Folder(user_id=cu["id"], name=folder_data.name)
     doc = folder.model_dump()
-    doc["created_at"] = doc["created_at"].isoformat()
     await db.folders.insert_one(doc)
     return folder
 
@@ -476,9 +894,9 @@ async def move_exam(eid: str, move_data: MoveContent, cu: dict = Depends(get_cur
         if not folder: raise HTTPException(404, "Target folder not found")
 
     await db.exams.update_one({"id": eid, "user_id": cu["id"]}, {"$set": {"folder_id": move_data.folder_id}})
-    exam = await db.exams.find_one({"id": eid}, {"_id": 0})
-    if isinstance(exam["created_at"], str): exam["created_at"] = datetime.fromisoformat(exam["created_at"])
-    return exam
+    exam = await db.exams.find_one({"id": eid, "user_id": cu["id"]}, {"_id": 0})
+    if not exam: raise HTTPException(404, "Not found")
+    return db_response(exam, compress=not has_images(exam))
 
 @api_router.put("/summaries/{sid}/move", response_model=Summary)
 async def move_summary(sid: str, move_data: MoveContent, cu: dict = Depends(get_current_user)):
@@ -487,9 +905,9 @@ async def move_summary(sid: str, move_data: MoveContent, cu: dict = Depends(get_
         if not folder: raise HTTPException(404, "Target folder not found")
 
     await db.summaries.update_one({"id": sid, "user_id": cu["id"]}, {"$set": {"folder_id": move_data.folder_id}})
-    summary = await db.summaries.find_one({"id": sid}, {"_id": 0})
-    if isinstance(summary["created_at"], str): summary["created_at"] = datetime.fromisoformat(summary["created_at"])
-    return summary
+    summary = await db.summaries.find_one({"id": sid, "user_id": cu["id"]}, {"_id": 0})
+    if not summary: raise HTTPException(404, "Not found")
+    return db_response(summary)
 
 # --- YENİ EKLENDİ: FLASHCARD ENDPOINTS ---
 
@@ -499,16 +917,13 @@ async def create_flashcard_set(
     folder_id: Optional[str] = Form(None),
     cu: dict = Depends(get_current_user)
 ):
-    if not pdf.filename.endswith('.pdf'): raise HTTPException(400, "PDF only")
-    
     if folder_id:
         folder = await db.folders.find_one({"id": folder_id, "user_id": cu["id"]})
         if not folder: raise HTTPException(404, "Folder not found")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(await pdf.read()); tmp_path = tmp.name
-    try:
-        text = extract_text_from_pdf(tmp_path)
+    upload = await read_pdf_upload(pdf)
+    async with admission.slot(cu["id"], "flashcards"):
+        text = extract_text_from_pdf(upload.file)
         if not text.strip(): raise HTTPException(400, "No text in PDF")
         
         cards = await generate_flashcards_with_ai(text)
@@ -521,24 +936,19 @@ async def create_flashcard_set(
         )
         
         doc = fc_set.model_dump()
-        doc["created_at"] = doc["created_at"].isoformat()
         await db.flashcards.insert_one(doc)
         return fc_set
-    finally: os.unlink(tmp_path)
 
 @api_router.get("/flashcards", response_model=List[FlashcardSet])
 async def get_flashcard_sets(cu: dict = Depends(get_current_user)):
     sets = await db.flashcards.find({"user_id": cu["id"]}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for s in sets:
-        if isinstance(s["created_at"], str): s["created_at"] = datetime.fromisoformat(s["created_at"])
-    return sets
+    return db_response(sets)
 
 @api_router.get("/flashcards/{fid}", response_model=FlashcardSet)
 async def get_flashcard_set(fid: str, cu: dict = Depends(get_current_user)):
     fc_set = await db.flashcards.find_one({"id": fid, "user_id": cu["id"]}, {"_id": 0})
     if not fc_set: raise HTTPException(404, "Flashcard set not found")
-    if isinstance(fc_set["created_at"], str): fc_set["created_at"] = datetime.fromisoformat(fc_set["created_at"])
-    return fc_set
+    return db_response(fc_set)
 
 @api_router.delete("/flashcards/{fid}")
 async def delete_flashcard_set(fid: str, cu: dict = Depends(get_current_user)):
@@ -553,9 +963,9 @@ async def move_flashcard_set(fid: str, move_data: MoveContent, cu: dict = Depend
         if not folder: raise HTTPException(404, "Target folder not found")
 
     await db.flashcards.update_one({"id": fid, "user_id": cu["id"]}, {"$set": {"folder_id": move_data.folder_id}})
-    fc_set = await db.flashcards.find_one({"id": fid}, {"_id": 0})
-    if isinstance(fc_set["created_at"], str): fc_set["created_at"] = datetime.fromisoformat(fc_set["created_at"])
-    return fc_set
+    fc_set = await db.flashcards.find_one({"id": fid, "user_id": cu["id"]}, {"_id": 0})
+    if not fc_set: raise HTTPException(404, "Not found")
+    return db_response(fc_set)
 
 # --- MEVCUT ENDPOINTLER ---
 
@@ -564,27 +974,25 @@ async def create_exam(
     pdf: UploadFile = File(...), 
     exam_type: str = Form("mixed"), 
     difficulty: str = Form("medium"), 
-    num_questions: int = Form(10), 
+    num_questions: int = Form(10, ge=5, le=50), 
     folder_id: Optional[str] = Form(None), 
     cu: dict = Depends(get_current_user)
 ):
-    if not pdf.filename.endswith('.pdf'): raise HTTPException(400, "PDF only")
-    
     if folder_id:
         folder = await db.folders.find_one({"id": folder_id, "user_id": cu["id"]})
         if not folder: raise HTTPException(404, "Folder not found")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(await pdf.read()); tmp_path = tmp.name
-    try:
-        qs = await generate_image_based_exam(tmp_path, difficulty, num_questions) if exam_type == "image_based" else await generate_exam_with_ai(extract_text_from_pdf(tmp_path), exam_type, difficulty, num_questions)
+    upload = await read_pdf_upload(pdf)
+    async with admission.slot(cu["id"], "exam", math.ceil(num_questions / EXAM_BATCH_SIZE)):
+        if exam_type == "image_based":
+            with pdf_for_rendering(upload) as pdf_source: qs = await generate_image_based_exam(pdf_source, difficulty, num_questions)
+        else: qs = await generate_exam_with_ai(extract_text_from_pdf(upload.file), exam_type, difficulty, num_questions)
         
-        exam = Exam(user_id=cu["id"], folder_id=folder_id, title=f"Exam from {pdf.filename}", exam_type=exam_type, difficulty=difficulty, questions=qs, pdf_name=pdf.filename)
+        exam = Exam(user_id=cu["id"], folder_id=folder_id, title=f"Exam from {pdf.filename}", exam_type=exam_type, difficulty=difficulty, questions=qs, pdf_name=pdf.filename, pdf_hash=upload.sha256)
         
-        doc = exam.model_dump(); doc["created_at"] = doc["created_at"].isoformat(); doc["questions"] = [q.model_dump() for q in qs]
+        doc = exam.model_dump(); doc["questions"] = [q.model_dump() for q in qs]
         await db.exams.insert_one(doc)
         return exam
-    finally: os.unlink(tmp_path)
 
 @api_router.post("/summarize")
 async def summarize_pdf_endpoint(
@@ -592,76 +1000,65 @@ async def summarize_pdf_endpoint(
     folder_id: Optional[str] = Form(None), 
     cu: dict = Depends(get_current_user)
 ):
-    if not pdf.filename.endswith('.pdf'): raise HTTPException(400, "Only PDF")
-    
     if folder_id:
         folder = await db.folders.find_one({"id": folder_id, "user_id": cu["id"]})
         if not folder: raise HTTPException(404, "Folder not found")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(await pdf.read()); tmp_path = tmp.name
-    try:
-        text = extract_text_from_pdf(tmp_path)
-        if not text.strip(): raise HTTPException(400, "No text in PDF")
-        
-        genai.configure(api_key=GOOGLE_AI_KEY)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        prompt = f"""Sen bu dersin uzmanı, kıdemli bir profesörsün. Öğrencilerin için aşağıdaki ders notlarını özetle.
+    upload = await read_pdf_upload(pdf)
+    async with admission.slot(cu["id"], "summarize"):
+        try:
+            text = extract_text_from_pdf(upload.file)
+            if not text.strip(): raise HTTPException(400, "No text in PDF")
+            
+            model = get_model('gemini-2.5-flash')
+            prompt = f"""Sen bu dersin uzmanı, kıdemli bir profesörsün. Öğrencilerin için aşağıdaki ders notlarını özetle.
         Kurallar:
         1. Akademik ama samimi ve anlaşılır bir dil kullan.
         2. Ana kavramları, tanımları ve kritik noktaları maddeler halinde vurgula.
         3. Konuyu bölümlere ayır ve başlıklar kullan.
         4. Türkçe konuş.
         İçerik: {text[:20000]}"""
-        
-        res = model.generate_content(prompt)
-        summary_text = res.text
-        
-        summary_obj = Summary(
-            user_id=cu["id"],
-            folder_id=folder_id,
-            title=f"Özet: {pdf.filename}",
-            content=summary_text
-        )
-        
-        summary_doc = summary_obj.model_dump()
-        summary_doc["created_at"] = summary_doc["created_at"].isoformat()
-        await db.summaries.insert_one(summary_doc)
-        return {"summary": summary_text, "id": summary_obj.id}
-    except Exception as e:
-        logging.error(f"Summarize error: {e}")
-        raise HTTPException(500, f"Summary failed: {str(e)}")
-    finally: os.unlink(tmp_path)
+            
+            res = model.generate_content(prompt)
+            summary_text = res.text
+            
+            summary_obj = Summary(
+                user_id=cu["id"],
+                folder_id=folder_id,
+                title=f"Özet: {pdf.filename}",
+                content=summary_text
+            )
+            
+            summary_doc = summary_obj.model_dump()
+            await db.summaries.insert_one(summary_doc)
+            return {"summary": summary_text, "id": summary_obj.id}
+        except Exception as e:
+            logging.error(f"Summarize error: {e}")
+            raise HTTPException(500, f"Summary failed: {str(e)}")
 
 @api_router.get("/summaries", response_model=List[Summary])
 async def get_summaries(cu: dict = Depends(get_current_user)):
     summaries = await db.summaries.find({"user_id": cu["id"]}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for s in summaries:
-        if isinstance(s["created_at"], str): s["created_at"] = datetime.fromisoformat(s["created_at"])
-    return summaries
+    return db_response(summaries)
 
 @api_router.get("/summaries/{summary_id}", response_model=Summary)
 async def get_summary(summary_id: str, current_user: dict = Depends(get_current_user)):
     summary = await db.summaries.find_one({"id": summary_id, "user_id": current_user["id"]}, {"_id": 0})
     if not summary:
         raise HTTPException(status_code=404, detail="Özet bulunamadı")
-    if isinstance(summary["created_at"], str):
-        summary["created_at"] = datetime.fromisoformat(summary["created_at"])
-    return summary
+    return db_response(summary)
 
 @api_router.get("/exams", response_model=List[Exam])
 async def get_exams(cu: dict = Depends(get_current_user)):
-    exams = await db.exams.find({"user_id": cu["id"]}, {"_id": 0}).to_list(1000)
-    for e in exams: 
-        if isinstance(e["created_at"], str): e["created_at"] = datetime.fromisoformat(e["created_at"])
-    return exams
+    # Liste görünümü soru görsellerine ihtiyaç duymaz; görseller /exams/{eid} ile alınır
+    exams = await db.exams.find({"user_id": cu["id"]}, {"_id": 0, "questions.image_data": 0}).to_list(1000)
+    return db_response(exams)
 
 @api_router.get("/exams/{eid}", response_model=Exam)
 async def get_exam(eid: str, cu: dict = Depends(get_current_user)):
     e = await db.exams.find_one({"id": eid, "user_id": cu["id"]}, {"_id": 0})
     if not e: raise HTTPException(404, "Not found")
-    if isinstance(e["created_at"], str): e["created_at"] = datetime.fromisoformat(e["created_at"])
-    return e
+    return db_response(e, compress=not has_images(e))
 
 @api_router.delete("/exams/{eid}")
 async def delete_exam(eid: str, cu: dict = Depends(get_current_user)):
@@ -673,24 +1070,26 @@ async def delete_exam(eid: str, cu: dict = Depends(get_current_user)):
 async def submit_exam(sub: ExamSubmission, cu: dict = Depends(get_current_user)):
     e = await db.exams.find_one({"id": sub.exam_id, "user_id": cu["id"]}, {"_id": 0})
     if not e: raise HTTPException(404, "Not found")
-    correct, fb = 0, []
-    for ans in sub.answers:
-        q = next((x for x in e["questions"] if x["id"] == ans.question_id), None)
-        if q:
-            is_c = await evaluate_answer_with_ai(q["question_text"], q["correct_answer"], ans.user_answer, q["question_type"])
-            if is_c: correct += 1
-            fb.append({"question_id": ans.question_id, "is_correct": is_c, "correct_answer": q["correct_answer"], "user_answer": ans.user_answer, "explanation": q.get("explanation", "")})
-    res = ExamResult(exam_id=sub.exam_id, user_id=cu["id"], score=(correct/len(e["questions"]))*100 if e["questions"] else 0, total_questions=len(e["questions"]), correct_answers=correct, answers=sub.answers, feedback=fb)
-    doc = res.model_dump(); doc["submitted_at"] = doc["submitted_at"].isoformat(); doc["answers"] = [a.model_dump() for a in sub.answers]
+    if len(sub.answers) > len(e["questions"]): raise HTTPException(400, "Too many answers")
+    questions = {q["id"]: q for q in e["questions"]}
+    ai_calls = sum(1 for a in sub.answers if a.question_id in questions and not answer_matches(questions[a.question_id]["correct_answer"], a.user_answer, questions[a.question_id]["question_type"]))
+    verdicts = []
+    async with admission.slot(cu["id"], "grade", max(1, ai_calls)):
+        for ans in sub.answers:
+            q = questions.get(ans.question_id)
+            verdicts.append(bool(q) and await evaluate_answer_with_ai(q["question_text"], q["correct_answer"], ans.user_answer, q["question_type"]))
+    correct = sum(verdicts)
+    res = ExamResult(exam_id=sub.exam_id, user_id=cu["id"], score=(correct/len(e["questions"]))*100 if e["questions"] else 0, total_questions=len(e["questions"]), correct_answers=correct, answers=sub.answers, verdicts=pack_verdicts(verdicts))
+    doc = res.model_dump(exclude={"feedback"})
     await db.exam_results.insert_one(doc)
+    res.feedback = build_feedback(doc, e)
     return res
 
-@api_router.get("/results", response_model=List[ExamResult])
+@api_router.get("/results", response_model=List[ExamResult], response_model_exclude_none=True)
 async def get_results(cu: dict = Depends(get_current_user)):
-    res = await db.exam_results.find({"user_id": cu["id"]}, {"_id": 0}).to_list(1000)
-    for r in res: 
-        if isinstance(r["submitted_at"], str): r["submitted_at"] = datetime.fromisoformat(r["submitted_at"])
-    return res
+    # Liste görünümü cevaplara ihtiyaç duymaz; detaylar /results/{rid} ile alınır
+    res = await db.exam_results.find({"user_id": cu["id"]}, {"_id": 0, "answers": 0, "verdicts": 0, "feedback": 0}).to_list(1000)
+    return db_response(res)
 
 # --- BU KODU server.py İÇİNE EKLE ---
 
@@ -705,11 +1104,28 @@ async def delete_summary(sid: str, cu: dict = Depends(get_current_user)):
 async def get_result(rid: str, cu: dict = Depends(get_current_user)):
     r = await db.exam_results.find_one({"id": rid, "user_id": cu["id"]}, {"_id": 0})
     if not r: raise HTTPException(404, "Not found")
-    if isinstance(r["submitted_at"], str): r["submitted_at"] = datetime.fromisoformat(r["submitted_at"])
-    return r
+    exam = await db.exams.find_one({"id": r["exam_id"]}, {"_id": 0, "questions.id": 1, "questions.correct_answer": 1, "questions.explanation": 1})
+    r["feedback"] = build_feedback(compact_result(r), exam)
+    return db_response(r)
 
 app.include_router(api_router)
+
+class UploadSizeLimitMiddleware:
+    """Content-Length bildirilmişse gövde okunmadan 413 döner (saf ASGI, akışa dokunmaz)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + UPLOAD_CHUNK_SIZE:
+                return await JSONResponse(status_code=413, content={"detail": "File too large"})(scope, receive, send)
+        await self.app(scope, receive, send)
+
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# JSON metni düşük seviyede de iyi sıkışır; seviye 9 büyük yanıtlarda CPU'ya değmez
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=GZIP_LEVEL)
 app.add_middleware(CORSMiddleware, allow_credentials=True, allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','), allow_methods=["*"], allow_headers=["*"])
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-@app.on_event("shutdown")
-async def shutdown(): client.close()
\ No newline at end of file
@@ -0,0 +1,171 @@
+import asyncio
+import math
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import AdmissionController, ExamSubmission
+
+
+def make_controller(**overrides):
+    options = dict(global_limit=1, user_limit=2, rate=1.0, burst=10, global_rate=10.0, global_burst=100, max_queue=8, queue_timeout=1.0)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+async def hold(controller, user_id, operation, order, seconds=0.02):
+    async with controller.slot(user_id, operation):
+        order.append((user_id, operation))
+        await asyncio.sleep(seconds)
+
+
+def test_priority_and_round_robin_order():
+    controller, order = make_controller(), []
+
+    async def run():
+        first = asyncio.create_task(hold(controller, "a", "exam", order))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(hold(controller, u, op, order)) for u, op in [("a", "exam"), ("a", "summarize"), ("b", "exam"), ("c", "grade")]]
+        await asyncio.gather(first, *tasks)
+
+    # a'nın ikinci isteği kullanıcı limitine (2) takılmaz; a'nın üçüncüsü takılır
+    controller.user_limit = 3
+    asyncio.run(run())
+    # Notlandırma önce, sonra a ve b sırayla
+    assert order == [("a", "exam"), ("c", "grade"), ("a", "exam"), ("b", "exam"), ("a", "summarize")]
+    assert controller.in_flight == 0 and controller._waiting == 0
+
+
+def test_queue_timeout_resets_counters_and_refunds_tokens():
+    controller = make_controller(queue_timeout=0.05, burst=6)
+
+    async def run():
+        holder = asyncio.create_task(hold(controller, "a", "grade", [], seconds=0.3))
+        await asyncio.sleep(0)
+        for _ in range(3):
+            with pytest.raises(HTTPException) as exc:
+                await controller.acquire("b", "exam")
+            assert exc.value.detail == "AI queue timeout"
+        await holder
+
+    asyncio.run(run())
+    assert controller.in_flight == 0 and controller._waiting == 0
+    assert controller._tokens("b") == pytest.approx(6)
+
+
+def test_cancel_while_queued():
+    controller = make_controller()
+
+    async def run():
+        holder = asyncio.create_task(hold(controller, "a", "grade", [], seconds=0.1))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(controller.acquire("b", "exam"))
+        await asyncio.sleep(0.01)
+        assert controller._waiting == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller._waiting == 0 and controller.state()["queued_users"] == 0
+        await holder
+
+    asyncio.run(run())
+    assert controller.in_flight == 0 and controller._active == {}
+
+
+def test_retry_after_values():
+    controller = make_controller(global_limit=4, user_limit=1, rate=0.5, burst=4, global_rate=1.0, global_burst=5)
+
+    async def run():
+        # Kullanıcı kovası: 4 - 2 = 2 token kaldı, 4 token için (4 - 2) / 0.5 = 4 sn
+        async with controller.slot("a", "exam"):
+            pass
+        with pytest.raises(HTTPException) as exc:
+            await controller.acquire("a", "exam", units=2)
+        assert exc.value.detail == "AI request budget exceeded"
+        assert exc.value.headers["Retry-After"] == "4"
+
+        # Global kova: 5 - 2 = 3 token kaldı, 4 token için (4 - 3) / 1 = 1 sn
+        with pytest.raises(HTTPException) as exc:
+            await controller.acquire("b", "exam", units=2)
+        assert exc.value.detail == "AI service busy"
+        assert exc.value.headers["Retry-After"] == "1"
+
+        # Kullanıcı eşzamanlılık limiti: ortalama slot süresi kadar
+        async with controller.slot("c", "grade"):
+            with pytest.raises(HTTPException) as exc:
+                await controller.acquire("c", "grade")
+            assert exc.value.detail == "Too many concurrent AI requests"
+            assert exc.value.headers["Retry-After"] == str(math.ceil(controller.avg_hold))
+
+    asyncio.run(run())
+
+
+def test_full_buckets_are_pruned():
+    controller = make_controller(rate=1000.0)
+
+    async def run():
+        async with controller.slot("a", "exam"):
+            pass
+
+    asyncio.run(run())
+    time.sleep(0.02)
+    assert controller._tokens("a") == controller.burst
+    assert "a" not in controller._buckets
+
+
+def test_exam_cost_scales_with_batches():
+    controller = make_controller(global_limit=4, rate=0.001, burst=10)
+
+    async def run():
+        # 3 parça x 2 token
+        async with controller.slot("a", "exam", units=3):
+            pass
+        # Kova kapasitesini aşan maliyet kapasiteye indirilir
+        async with controller.slot("b", "exam", units=50):
+            pass
+
+    asyncio.run(run())
+    assert controller._tokens("a") == pytest.approx(4, abs=0.01)
+    assert controller._tokens("b") == pytest.approx(0, abs=0.01)
+
+
+class GradingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        return type("Response", (), {"text": '{"is_correct": true}'})()
+
+
+class GradingDB:
+    def __init__(self, exam):
+        self.exams = type("Exams", (), {"find_one": staticmethod(lambda *a: asyncio.sleep(0, exam))})()
+        self.exam_results = type("Results", (), {"insert_one": staticmethod(lambda doc: asyncio.sleep(0))})()
+
+
+def test_grading_is_charged_per_ai_call(monkeypatch):
+    exam = {"id": "e1", "questions": [
+        {"id": "q1", "question_text": "?", "question_type": "multiple_choice", "correct_answer": "A. Ankara"},
+        {"id": "q2", "question_text": "?", "question_type": "open_ended", "correct_answer": "Fotosentez"},
+        {"id": "q3", "question_text": "?", "question_type": "open_ended", "correct_answer": "Mitokondri"},
+    ]}
+    model, controller = GradingModel(), make_controller(rate=0.001)
+    monkeypatch.setattr(server, "db", GradingDB(exam))
+    monkeypatch.setattr(server, "admission", controller)
+    monkeypatch.setattr(server, "get_model", lambda name: model)
+
+    # q1 şık harfiyle eşleşir; q2 ve q3 AI ile değerlendirilir
+    answers = [{"question_id": "q1", "user_answer": "a"}, {"question_id": "q2", "user_answer": "bitkiler besin üretir"}, {"question_id": "q3", "user_answer": "enerji"}]
+    result = asyncio.run(server.submit_exam(ExamSubmission(exam_id="e1", answers=answers), {"id": "u"}))
+    assert result.correct_answers == 3
+    assert model.calls == 2
+    assert controller._tokens("u") == pytest.approx(controller.burst - 2, abs=0.01)
+
+    # Sınavdaki soru sayısından fazla cevap reddedilir
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.submit_exam(ExamSubmission(exam_id="e1", answers=answers * 2), {"id": "u"}))
+    assert exc.value.status_code == 400
+    assert model.calls == 2
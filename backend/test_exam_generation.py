@@ -0,0 +1,116 @@
+import asyncio
+import json
+import random
+import re
+
+from fastapi.testclient import TestClient
+
+import server
+from server import Question, dedupe_questions, split_pdf_sections
+
+VOCAB = [f"kavram{i}" for i in range(5000)]
+random.seed(30)
+
+
+def question(text, options=None):
+    return Question(question_text=text, question_type="multiple_choice" if options else "open_ended", options=options, correct_answer="A")
+
+
+def test_split_keeps_all_text_and_word_boundaries():
+    text = "\n".join(" ".join(random.sample(VOCAB, 12)) for _ in range(600))
+    slices = split_pdf_sections(text, 5)
+    assert len(slices) == 5
+    # Hiçbir kelime kaybolmaz veya ortadan bölünmez
+    assert " ".join(slices).split() == text.split()
+    assert max(map(len, slices)) < 1.5 * min(map(len, slices))
+
+
+def test_split_caps_slices_for_short_text():
+    assert split_pdf_sections("short", 10) == ["short"]
+    text = " ".join(VOCAB[:300])
+    slices = split_pdf_sections(text, 10)
+    assert 1 < len(slices) < 10
+    assert all(len(sl) >= server.EXAM_MIN_SLICE_CHARS * 0.9 for sl in slices)
+
+
+def test_split_by_paragraphs():
+    paragraphs = [f"Paragraf {i} " + " ".join(VOCAB[i:i + 20]) for i in range(40)]
+    slices = split_pdf_sections("\n\n".join(paragraphs), 4)
+    assert len(slices) == 4
+    assert sum(sl.count("Paragraf") for sl in slices) == 40
+    assert slices[0].startswith("Paragraf 0") and slices[-1].endswith(paragraphs[-1])
+
+
+def test_dedupe_drops_near_duplicates():
+    existing = [question("Türkiye'nin başkenti hangi şehirdir?")]
+    candidates = [
+        question("Türkiye'nin başkenti hangi şehirdir"),
+        question("Fransa'nın başkenti hangi şehirdir?"),
+        question("Fotosentez hangi organelde gerçekleşir?"),
+        question("Fotosentez hangi organelde gerçekleşir ?"),
+    ]
+    accepted = dedupe_questions(existing, candidates)
+    assert [q.question_text for q in accepted] == ["Fransa'nın başkenti hangi şehirdir?", "Fotosentez hangi organelde gerçekleşir?"]
+
+
+def test_dedupe_uses_options():
+    stem = "Aşağıdakilerden hangisi doğrudur?"
+    a = question(stem, ["Hücre zarı seçici geçirgendir", "Mitokondri protein üretir"])
+    b = question(stem, ["Su 100 derecede kaynar", "Işık sesten yavaştır"])
+    assert dedupe_questions([a], [b]) == [b]
+
+
+class FakeModel:
+    delay = 0.05
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = self.peak = 0
+
+    async def generate_content_async(self, prompt):
+        count = int(re.search(r"içerikten (\d+) adet", prompt).group(1))
+        self.calls.append(count)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        items = [{"question_text": "Aşağıdakilerden hangisi " + " ".join(random.sample(VOCAB, 8)) + " için doğrudur?",
+                  "question_type": "multiple_choice", "options": random.sample(VOCAB, 5), "correct_answer": "A"} for _ in range(count)]
+        # Bir tekrar ve bir bozuk soru
+        items.append(dict(items[0], question_text=items[0]["question_text"].rstrip("?")))
+        items.append({"question_text": "bozuk", "question_type": "bilinmeyen", "correct_answer": "A"})
+        return type("Response", (), {"text": json.dumps(items)})()
+
+
+def test_large_exam_runs_in_parallel(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(server, "get_model", lambda name: model)
+    text = " ".join(random.choice(VOCAB) for _ in range(20000))
+
+    questions = asyncio.run(server.generate_exam_with_ai(text, "multiple_choice", "medium", 50))
+    assert len(questions) == 50
+    assert len({q.question_text for q in questions}) == 50
+    assert model.calls == [12] * 5
+    assert model.peak == 5
+
+
+def test_parallel_batches_are_limited(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(server, "get_model", lambda name: model)
+    monkeypatch.setattr(server, "EXAM_MAX_PARALLEL_BATCHES", 2)
+    text = " ".join(random.choice(VOCAB) for _ in range(20000))
+
+    assert len(asyncio.run(server.generate_exam_with_ai(text, "multiple_choice", "medium", 50))) == 50
+    assert len(model.calls) == 5
+    assert model.peak == 2
+
+
+def test_question_count_is_bounded():
+    server.app.dependency_overrides[server.get_current_user] = lambda: {"id": "u"}
+    try:
+        client = TestClient(server.app)
+        for num_questions in (4, 51, 2000):
+            response = client.post("/api/exams/create", data={"num_questions": num_questions}, files={"pdf": ("notes.pdf", b"%PDF-1.4", "application/pdf")})
+            assert response.status_code == 422
+    finally:
+        server.app.dependency_overrides.clear()
@@ -0,0 +1,100 @@
+import asyncio
+import copy
+import random
+from typing import NamedTuple
+
+import server
+from server import build_feedback, compact_result, migrate_exam_results, pack_verdicts, unpack_verdicts
+
+EXAM = {"questions": [
+    {"id": "q1", "correct_answer": "A", "explanation": "Birinci açıklama"},
+    {"id": "q2", "correct_answer": "Doğru", "explanation": "İkinci açıklama"},
+    {"id": "q3", "correct_answer": "Ankara"},
+]}
+
+
+def legacy_result(result_id="r1"):
+    # Eski format: feedback, sınavdaki doğru cevap ve açıklamayı kopyalar
+    return {
+        "id": result_id,
+        "answers": [
+            {"question_id": "q1", "user_answer": "B"},
+            {"question_id": "silinmis", "user_answer": "x"},
+            {"question_id": "q2", "user_answer": "Doğru"},
+            {"question_id": "q3", "user_answer": "ankara"},
+        ],
+        "feedback": [
+            {"question_id": "q1", "is_correct": False, "correct_answer": "A", "user_answer": "B", "explanation": "Birinci açıklama"},
+            {"question_id": "q2", "is_correct": True, "correct_answer": "Doğru", "user_answer": "Doğru", "explanation": "İkinci açıklama"},
+            {"question_id": "q3", "is_correct": True, "correct_answer": "Ankara", "user_answer": "ankara", "explanation": ""},
+        ],
+    }
+
+
+class RecordedUpdate(NamedTuple):
+    filter: dict
+    update: dict
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        field = next(iter(query))
+        async def cursor():
+            for doc in self.docs:
+                if field in doc: yield copy.deepcopy(doc)
+        return cursor()
+
+    async def bulk_write(self, ops, ordered=True):
+        modified = 0
+        for op in ops:
+            doc = next(d for d in self.docs if d["_id"] == op.filter["_id"])
+            before = copy.deepcopy(doc)
+            doc.update(op.update.get("$set", {}))
+            for key in op.update.get("$unset", {}): doc.pop(key, None)
+            modified += doc != before
+        return type("BulkWriteResult", (), {"modified_count": modified})()
+
+
+class FakeDB:
+    def __init__(self, docs):
+        self.exam_results = FakeCollection(docs)
+
+
+def test_verdict_bitset_round_trip():
+    for count in [0, 1, 7, 8, 9, 50, 130]:
+        flags = [random.random() < 0.5 for _ in range(count)]
+        packed = pack_verdicts(flags)
+        assert len(packed) == 2 * ((count + 7) // 8)
+        assert unpack_verdicts(packed, count) == flags
+    # Eksik bitler yanlış sayılır
+    assert unpack_verdicts("", 3) == [False, False, False]
+
+
+def test_legacy_feedback_survives_compaction():
+    doc = legacy_result()
+    stored_feedback = copy.deepcopy(doc["feedback"])
+    compacted = compact_result(doc)
+    assert "feedback" not in compacted
+    assert build_feedback(compacted, EXAM) == stored_feedback
+
+
+def test_build_feedback_without_exam():
+    assert build_feedback(compact_result(legacy_result()), None) == []
+
+
+def test_migration_is_idempotent(monkeypatch):
+    monkeypatch.setattr(server, "UpdateOne", RecordedUpdate)
+    docs = [dict(legacy_result(f"r{i}"), _id=i) for i in range(5)]
+    docs.append({"_id": 99, "id": "yeni", "answers": [{"question_id": "q1", "user_answer": "A"}], "verdicts": "01"})
+    db = FakeDB(docs)
+
+    assert asyncio.run(migrate_exam_results(db, batch_size=2)) == 5
+    snapshot = copy.deepcopy(docs)
+    assert all("feedback" not in d for d in docs)
+    assert docs[0]["verdicts"] == pack_verdicts([False, False, True, True])
+
+    assert asyncio.run(migrate_exam_results(db, batch_size=2)) == 0
+    assert docs == snapshot
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# server.py soğuk import süresi bu bütçeyi (ms) aşmamalı
+IMPORT_BUDGET_MS = int(os.environ.get("IMPORT_BUDGET_MS", "1000"))
+HEAVY_MODULES = ["google.generativeai", "PyPDF2", "pdf2image", "PIL", "fitz"]
+
+PROBE = f"""
+import sys, time
+t = time.perf_counter()
+import server
+elapsed = (time.perf_counter() - t) * 1000
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(f"{{elapsed:.0f}}|{{','.join(loaded)}}")
+"""
+
+
+def measure_import():
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", PROBE],
+        cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+    elapsed, loaded = out.split("|")
+    return float(elapsed), [m for m in loaded.split(",") if m]
+
+
+def test_import_has_no_heavy_modules():
+    _, loaded = measure_import()
+    assert not loaded, f"Import sırasında yüklenen ağır modüller: {loaded}"
+
+
+def test_import_time_budget():
+    elapsed, _ = measure_import()
+    assert elapsed <= IMPORT_BUDGET_MS, f"Import {elapsed:.0f} ms sürdü (bütçe {IMPORT_BUDGET_MS} ms)"
+
+
+if __name__ == "__main__":
+    elapsed, loaded = measure_import()
+    print(f"⏱️  server.py import süresi: {elapsed:.0f} ms (bütçe {IMPORT_BUDGET_MS} ms)")
+    if loaded:
+        print(f"❌ Ağır modüller import sırasında yüklendi: {', '.join(loaded)}")
+    elif elapsed > IMPORT_BUDGET_MS:
+        print("❌ Bütçe aşıldı!")
+    else:
+        print("✅ Soğuk başlangıç bütçe içinde.")
@@ -0,0 +1,34 @@
+import asyncio
+import io
+import os
+
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers, UploadFile
+
+import server
+
+
+def make_upload(data):
+    return UploadFile(io.BytesIO(data), filename="notes.pdf", headers=Headers({"content-type": "application/pdf"}))
+
+
+def test_oversized_content_length_is_rejected():
+    client = TestClient(server.app)
+    response = client.post("/api/exams/create", headers={"Content-Length": str(server.MAX_UPLOAD_BYTES * 2)}, content=b"")
+    assert response.status_code == 413
+    assert response.json() == {"detail": "File too large"}
+
+
+def test_large_pdf_is_rendered_from_temp_file(monkeypatch):
+    data = b"%PDF-1.4\n" + os.urandom(4096)
+    upload = asyncio.run(server.read_pdf_upload(make_upload(data)))
+    assert upload.size == len(data)
+
+    with server.pdf_for_rendering(upload) as source:
+        assert source == data
+
+    monkeypatch.setattr(server, "UPLOAD_MEMORY_BYTES", 1024)
+    with server.pdf_for_rendering(upload) as source:
+        path = source
+        with open(path, "rb") as f: assert f.read() == data
+    assert not os.path.exists(path)